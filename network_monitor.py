@@ -5,21 +5,34 @@ Supports TCP/UDP testing, multiple hosts, web dashboard, alerts, and more.
 """
 
 import socket
+import sys
 import time
 import argparse
 import json
 import csv
+import errno
+import gzip
+import heapq
+import functools
 import os
 import signal
+import struct
+import selectors
 import threading
+import queue
 import smtplib
-import urllib.request
-import urllib.error
+import http.client
+import urllib.parse
+import importlib.util
+import concurrent.futures
+import multiprocessing
+from array import array
+from collections import deque
 from datetime import datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dataclasses import dataclass, field
-from typing import Optional, List, Dict, Any, Callable
+from typing import Optional, List, Dict, Tuple, Any, Callable, Deque
 
 # ============== CONFIGURATION DEFAULTS ==============
 DEFAULT_HOSTS = ['1.1.1.1:53']
@@ -29,20 +42,54 @@ DEFAULT_PACKET_LOSS_THRESHOLD = 0.3
 DEFAULT_FILE_WRITE_INTERVAL = 10
 DEFAULT_MAX_SECONDS_IN_MEMORY = 3600
 
+# Linux struct tcp_info offsets: tcpi_state (u8) and tcpi_rtt (u32, microseconds)
+TCP_INFO_LEN = 104
+TCP_INFO_RTT_OFFSET = 68
+TCP_ESTABLISHED = 1
+TCP_REUSE_SUPPORTED = hasattr(socket, 'TCP_INFO') and hasattr(socket, 'TCP_KEEPIDLE')
+CONNECT_PENDING = frozenset(e for e in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, 'WSAEWOULDBLOCK', None)) if e is not None)
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMP_PAYLOAD = b'network-monitor'
+# Linux-only; not exported by every Python build
+SO_BUSY_POLL = getattr(socket, 'SO_BUSY_POLL', 46 if sys.platform.startswith('linux') else None)
+DATACLASS_SLOTS: Dict[str, bool] = {'slots': True} if sys.version_info >= (3, 10) else {}
 
-@dataclass
+# Optional: faster JSON
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_bytes(obj: Any, indent: bool = False) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0))
+    if indent:
+        return json.dumps(obj, indent=2).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+@functools.lru_cache(maxsize=4096)
+def format_epoch(epoch: int) -> str:
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(epoch))
+
+
+@dataclass(**DATACLASS_SLOTS)
 class HostConfig:
     host: str
     port: int
     protocol: str = 'tcp'
     name: str = ''
+    address: Tuple[str, int] = field(init=False, repr=False)
     
     def __post_init__(self):
         if not self.name:
             self.name = f"{self.host}:{self.port}/{self.protocol}"
+        self.address = (self.host, self.port)
 
 
-@dataclass 
+@dataclass(**DATACLASS_SLOTS)
 class TestResult:
     timestamp: datetime
     host: str
@@ -53,39 +100,154 @@ class TestResult:
     error: Optional[str] = None
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class AggregatedStats:
     sent: int = 0
     received: int = 0
-    rtts: List[float] = field(default_factory=list)
+    rtt_sum: float = 0.0
+    rtt_sq_sum: float = 0.0  # Sum of squared RTTs, for the standard deviation (jitter)
+    rtt_count: int = 0
     success_count: int = 0
     fail_count: int = 0
+    ts_epoch: int = 0  # Unix time of the bucket start
     
     @property
     def avg_rtt(self) -> float:
-        return sum(self.rtts) / len(self.rtts) if self.rtts else 0
+        return self.rtt_sum / self.rtt_count if self.rtt_count else 0.0
+    
+    @property
+    def rtt_stddev(self) -> float:
+        if not self.rtt_count:
+            return 0.0
+        mean = self.rtt_sum / self.rtt_count
+        return max(self.rtt_sq_sum / self.rtt_count - mean * mean, 0.0) ** 0.5
     
     @property
     def packet_loss(self) -> float:
         return (self.sent - self.received) / self.sent if self.sent > 0 else 0
     
+    def is_outage(self, threshold: float) -> bool:
+        return self.packet_loss > threshold
+    
+    def record(self, success: bool, rtt_ms: Optional[float]):
+        self.sent += 1
+        if success:
+            self.received += 1
+            self.success_count += 1
+            if rtt_ms is not None:
+                self.rtt_sum += rtt_ms
+                self.rtt_sq_sum += rtt_ms * rtt_ms
+                self.rtt_count += 1
+        else:
+            self.fail_count += 1
+    
+    def merge(self, other: 'AggregatedStats'):
+        self.sent += other.sent
+        self.received += other.received
+        self.rtt_sum += other.rtt_sum
+        self.rtt_sq_sum += other.rtt_sq_sum
+        self.rtt_count += other.rtt_count
+        self.success_count += other.success_count
+        self.fail_count += other.fail_count
+    
+    def subtract(self, other: 'AggregatedStats'):
+        self.sent -= other.sent
+        self.received -= other.received
+        self.rtt_sum -= other.rtt_sum
+        self.rtt_sq_sum -= other.rtt_sq_sum
+        self.rtt_count -= other.rtt_count
+        self.success_count -= other.success_count
+        self.fail_count -= other.fail_count
+    
+    @classmethod
+    def combine(cls, buckets) -> 'AggregatedStats':
+        total = cls()
+        for stats in buckets:
+            total.merge(stats)
+        return total
+    
     def to_dict(self) -> Dict[str, Any]:
         return {
             'sent': self.sent,
             'received': self.received,
             'avg_rtt': self.avg_rtt,
+            'rtt_stddev': self.rtt_stddev,
             'success_count': self.success_count,
             'fail_count': self.fail_count,
             'packet_loss': self.packet_loss
         }
 
 
+class SlidingWindow:
+    def __init__(self, size: int):
+        self.size = size
+        self.totals = AggregatedStats()
+        self._buckets: Deque[AggregatedStats] = deque()
+    
+    def push(self, stats: AggregatedStats):
+        if self.size <= 0:
+            return
+        self._buckets.append(stats)
+        self.totals.merge(stats)
+        if len(self._buckets) > self.size:
+            self.totals.subtract(self._buckets.popleft())
+
+
+@dataclass
+class HostSeries:
+    second: Dict[int, AggregatedStats] = field(default_factory=dict)
+    minute: Dict[int, AggregatedStats] = field(default_factory=dict)
+    hour: Dict[int, AggregatedStats] = field(default_factory=dict)
+    # Sum of the retained closed seconds
+    totals: AggregatedStats = field(default_factory=AggregatedStats)
+    # Running second/minute/hour buckets; probes are recorded into the second only
+    current: Tuple[AggregatedStats, ...] = ()
+    current_epoch: int = -1
+    pending_seconds: List[Tuple[int, AggregatedStats]] = field(default_factory=list)
+    pending_minutes: List[Tuple[int, AggregatedStats]] = field(default_factory=list)
+    outages: List[Tuple[int, Dict[str, Any]]] = field(default_factory=list)
+    open_outage: Optional[Dict[str, Any]] = None
+    open_outage_end: int = 0
+    print_window: Optional[SlidingWindow] = None
+    alert_window: SlidingWindow = field(default_factory=lambda: SlidingWindow(9))
+
+
 class AlertManager:
     def __init__(self, config: Dict[str, Any]):
         self.email_config = config.get('email', {})
         self.webhook_urls = config.get('webhooks', [])
         self.last_alert_time: Dict[str, float] = {}
         self.alert_cooldown = config.get('cooldown', 300)
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._http: Dict[Tuple[str, str], http.client.HTTPConnection] = {}
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        if self.email_config.get('enabled') or self.webhook_urls:
+            self._thread = threading.Thread(target=self._drain_alert_queue, daemon=True)
+            self._thread.start()
+    
+    def _drain_alert_queue(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            func, args = job
+            func(*args)
+    
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+        for conn in self._http.values():
+            conn.close()
+        self._http.clear()
         
     def should_alert(self, host: str) -> bool:
         now = time.time()
@@ -98,32 +260,75 @@ class AlertManager:
     def send_email_alert(self, subject: str, body: str):
         if not self.email_config.get('enabled'):
             return
+        self._queue.put((self._send_email, (subject, body)))
+    
+    def _smtp_connection(self) -> smtplib.SMTP:
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp.close()
+            self._smtp = None
+        server = smtplib.SMTP(self.email_config['smtp_host'], self.email_config.get('smtp_port', 587), timeout=30)
+        server.starttls()
+        server.login(self.email_config['username'], self.email_config['password'])
+        self._smtp = server
+        return server
+    
+    def _send_email(self, subject: str, body: str):
         try:
             msg = MIMEMultipart()
             msg['From'] = self.email_config['from']
             msg['To'] = self.email_config['to']
             msg['Subject'] = subject
             msg.attach(MIMEText(body, 'plain'))
-            server = smtplib.SMTP(self.email_config['smtp_host'], self.email_config.get('smtp_port', 587))
-            server.starttls()
-            server.login(self.email_config['username'], self.email_config['password'])
-            server.sendmail(self.email_config['from'], self.email_config['to'], msg.as_string())
-            server.quit()
+            self._smtp_connection().sendmail(self.email_config['from'], self.email_config['to'], msg.as_string())
             print(f"📧 Email alert sent: {subject}")
         except Exception as e:
+            if self._smtp is not None:
+                self._smtp.close()
+                self._smtp = None
             print(f"⚠️ Failed to send email: {e}")
     
     def send_webhook_alert(self, data: Dict[str, Any]):
+        if not self.webhook_urls:
+            return
+        self._queue.put((self._send_webhooks, (json_bytes(data),)))
+    
+    def _send_webhooks(self, payload: bytes):
         for url in self.webhook_urls:
             try:
-                payload = json.dumps(data).encode('utf-8')
-                req = urllib.request.Request(url, data=payload, headers={'Content-Type': 'application/json'})
-                with urllib.request.urlopen(req, timeout=10) as response:
-                    if response.status == 200:
-                        print(f"🔔 Webhook sent to {url}")
+                if self._post_json(url, payload) == 200:
+                    print(f"🔔 Webhook sent to {url}")
             except Exception as e:
                 print(f"⚠️ Failed to send webhook to {url}: {e}")
     
+    def _post_json(self, url: str, payload: bytes) -> int:
+        parts = urllib.parse.urlsplit(url)
+        conn_key = (parts.scheme, parts.netloc)
+        conn = self._http.get(conn_key)
+        reused = conn is not None
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+            conn = self._http[conn_key] = conn_class(parts.netloc, timeout=10)
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        while True:
+            try:
+                conn.request('POST', path, body=payload, headers={'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                response.read()
+                return response.status
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if not reused:
+                    raise
+                reused = False
+            except Exception:
+                conn.close()
+                raise
+    
     def alert_outage(self, host: str, stats: Dict[str, Any]):
         if not self.should_alert(host):
             return
@@ -135,63 +340,321 @@ class AlertManager:
 
 
 class ConnectionTester:
+    _UDP_BUF = bytearray(1024)
+    _icmp_seq = 0
+    
     @staticmethod
-    def test_tcp(host: str, port: int, timeout: float) -> TestResult:
+    def sweep(tcp_hosts: List[HostConfig], udp_hosts: List[HostConfig], timeout: float,
+              selector: selectors.BaseSelector, dgram_socks: Dict[str, socket.socket],
+              pool: Optional[Dict[str, socket.socket]] = None, busy_poll: int = 0,
+              icmp_hosts: List[HostConfig] = (), icmp_type: int = socket.SOCK_DGRAM) -> Dict[str, TestResult]:
+        results: Dict[str, TestResult] = {}
+        now = datetime.now()
+        ConnectionTester._icmp_seq = seq = (ConnectionTester._icmp_seq + 1) & 0xFFFF
+        ConnectionTester._start_tcp(tcp_hosts, selector, pool, busy_poll, now, results)
+        ConnectionTester._start_udp(udp_hosts, selector, dgram_socks, busy_poll, now, results)
+        ConnectionTester._start_icmp(icmp_hosts, selector, dgram_socks, icmp_type, seq, busy_poll, now, results)
+        deadline = time.perf_counter_ns() + int(timeout * 1_000_000_000)
+        while selector.get_map():
+            remaining = deadline - time.perf_counter_ns()
+            if remaining <= 0:
+                break
+            for key, _ in selector.select(remaining / 1_000_000_000):
+                end = time.perf_counter_ns()
+                host, start = key.data
+                sock = key.fileobj
+                if host.protocol == 'icmp':
+                    try:
+                        if not ConnectionTester._read_echo_reply(sock, icmp_type, seq):
+                            # Not our reply; keep waiting
+                            continue
+                        results[host.name] = TestResult(timestamp=now, host=host.host, port=host.port, protocol='icmp', success=True, rtt_ms=(end - start) / 1_000_000)
+                        selector.unregister(sock)
+                    except Exception as e:
+                        selector.unregister(sock)
+                        del dgram_socks[host.name]
+                        sock.close()
+                        results[host.name] = TestResult(timestamp=now, host=host.host, port=host.port, protocol='icmp', success=False, error=str(e))
+                    continue
+                selector.unregister(sock)
+                if host.protocol == 'udp':
+                    try:
+                        sock.recv_into(ConnectionTester._UDP_BUF)
+                        results[host.name] = TestResult(timestamp=now, host=host.host, port=host.port, protocol='udp', success=True, rtt_ms=(end - start) / 1_000_000)
+                    except Exception as e:
+                        del dgram_socks[host.name]
+                        sock.close()
+                        results[host.name] = TestResult(timestamp=now, host=host.host, port=host.port, protocol='udp', success=False, error=str(e))
+                    continue
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err == 0 and pool is not None:
+                    pool[host.name] = sock
+                else:
+                    sock.close()
+                if err == 0:
+                    results[host.name] = TestResult(timestamp=now, host=host.host, port=host.port, protocol='tcp', success=True, rtt_ms=(end - start) / 1_000_000)
+                else:
+                    results[host.name] = TestResult(timestamp=now, host=host.host, port=host.port, protocol='tcp', success=False, error=os.strerror(err))
+        end = time.perf_counter_ns()
+        for key in list(selector.get_map().values()):
+            host, start = key.data
+            selector.unregister(key.fileobj)
+            if host.protocol == 'udp':
+                # No reply is not a failure for UDP
+                results[host.name] = TestResult(timestamp=now, host=host.host, port=host.port, protocol='udp', success=True, rtt_ms=(end - start) / 1_000_000)
+            elif host.protocol == 'icmp':
+                results[host.name] = TestResult(timestamp=now, host=host.host, port=host.port, protocol='icmp', success=False, error='timed out')
+            else:
+                key.fileobj.close()
+                results[host.name] = TestResult(timestamp=now, host=host.host, port=host.port, protocol='tcp', success=False, error='timed out')
+        return results
+    
+    @staticmethod
+    def _start_tcp(hosts: List[HostConfig], selector: selectors.BaseSelector, pool: Optional[Dict[str, socket.socket]],
+                   busy_poll: int, now: datetime, results: Dict[str, TestResult]):
+        connect_hosts = hosts
+        if pool is not None:
+            connect_hosts = []
+            for host in hosts:
+                sock = pool.get(host.name)
+                result = ConnectionTester.probe_pooled_tcp(host, sock, now) if sock is not None else None
+                if result is None or not result.success:
+                    if sock is not None:
+                        del pool[host.name]
+                        sock.close()
+                    if result is None:
+                        connect_hosts.append(host)
+                        continue
+                results[host.name] = result
+        for host in connect_hosts:
+            sock = None
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                if busy_poll:
+                    sock.setsockopt(socket.SOL_SOCKET, SO_BUSY_POLL, busy_poll)
+                if pool is not None:
+                    ConnectionTester._enable_keepalive(sock)
+                start = time.perf_counter_ns()
+                err = sock.connect_ex(host.address)
+                if err not in CONNECT_PENDING:
+                    sock.close()
+                    results[host.name] = TestResult(timestamp=now, host=host.host, port=host.port, protocol='tcp', success=False, error=os.strerror(err))
+                    continue
+                selector.register(sock, selectors.EVENT_WRITE, (host, start))
+            except Exception as e:
+                if sock is not None:
+                    sock.close()
+                results[host.name] = TestResult(timestamp=now, host=host.host, port=host.port, protocol='tcp', success=False, error=str(e))
+    
+    @staticmethod
+    def _enable_keepalive(sock: socket.socket):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 1)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 1)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+    
+    @staticmethod
+    def probe_pooled_tcp(host: HostConfig, sock: socket.socket, now: datetime) -> Optional[TestResult]:
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(timeout)
-            start = time.perf_counter()
-            sock.connect((host, port))
-            end = time.perf_counter()
-            sock.close()
-            return TestResult(timestamp=datetime.now(), host=host, port=port, protocol='tcp', success=True, rtt_ms=(end - start) * 1000)
+            if sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b'':
+                return None
+        except BlockingIOError:
+            pass
         except Exception as e:
-            return TestResult(timestamp=datetime.now(), host=host, port=port, protocol='tcp', success=False, error=str(e))
+            return TestResult(timestamp=now, host=host.host, port=host.port, protocol='tcp', success=False, error=str(e))
+        info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, TCP_INFO_LEN)
+        if info[0] != TCP_ESTABLISHED:
+            return TestResult(timestamp=now, host=host.host, port=host.port, protocol='tcp', success=False, error='connection lost')
+        rtt_us = struct.unpack_from('I', info, TCP_INFO_RTT_OFFSET)[0]
+        return TestResult(timestamp=now, host=host.host, port=host.port, protocol='tcp', success=True, rtt_ms=rtt_us / 1000)
+    
+    @staticmethod
+    def _start_udp(hosts: List[HostConfig], selector: selectors.BaseSelector, socks: Dict[str, socket.socket],
+                   busy_poll: int, now: datetime, results: Dict[str, TestResult]):
+        for host in hosts:
+            sock = socks.get(host.name)
+            try:
+                if sock is None:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    sock.setblocking(False)
+                    if busy_poll:
+                        sock.setsockopt(socket.SOL_SOCKET, SO_BUSY_POLL, busy_poll)
+                    sock.connect(host.address)
+                    socks[host.name] = sock
+                else:
+                    ConnectionTester._drain_dgram(sock)
+                start = time.perf_counter_ns()
+                sock.send(b'\x00')
+                selector.register(sock, selectors.EVENT_READ, (host, start))
+            except Exception as e:
+                if sock is not None:
+                    socks.pop(host.name, None)
+                    sock.close()
+                results[host.name] = TestResult(timestamp=now, host=host.host, port=host.port, protocol='udp', success=False, error=str(e))
     
     @staticmethod
-    def test_udp(host: str, port: int, timeout: float) -> TestResult:
+    def _drain_dgram(sock: socket.socket):
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock.settimeout(timeout)
-            start = time.perf_counter()
-            sock.sendto(b'\x00', (host, port))
+            while True:
+                sock.recv_into(ConnectionTester._UDP_BUF)
+        except BlockingIOError:
+            pass
+        except OSError:
+            pass
+    
+    @staticmethod
+    def icmp_socket_type() -> Optional[int]:
+        for sock_type in (socket.SOCK_DGRAM, socket.SOCK_RAW):
             try:
-                sock.recvfrom(1024)
-            except socket.timeout:
-                pass
-            end = time.perf_counter()
-            sock.close()
-            return TestResult(timestamp=datetime.now(), host=host, port=port, protocol='udp', success=True, rtt_ms=(end - start) * 1000)
-        except Exception as e:
-            return TestResult(timestamp=datetime.now(), host=host, port=port, protocol='udp', success=False, error=str(e))
+                socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP).close()
+                return sock_type
+            except OSError:
+                continue
+        return None
+    
+    @staticmethod
+    def _icmp_ident(sock: socket.socket) -> int:
+        # Tells our replies apart on raw sockets
+        return (os.getpid() ^ sock.fileno()) & 0xFFFF
+    
+    @staticmethod
+    def _icmp_checksum(data: bytes) -> int:
+        if len(data) % 2:
+            data += b'\x00'
+        total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+        total = (total >> 16) + (total & 0xFFFF)
+        total += total >> 16
+        return ~total & 0xFFFF
+    
+    @staticmethod
+    def _start_icmp(hosts: List[HostConfig], selector: selectors.BaseSelector, socks: Dict[str, socket.socket],
+                    sock_type: int, seq: int, busy_poll: int, now: datetime, results: Dict[str, TestResult]):
+        for host in hosts:
+            sock = socks.get(host.name)
+            try:
+                if sock is None:
+                    sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+                    sock.setblocking(False)
+                    if busy_poll:
+                        sock.setsockopt(socket.SOL_SOCKET, SO_BUSY_POLL, busy_poll)
+                    sock.connect((host.host, 0))
+                    socks[host.name] = sock
+                else:
+                    ConnectionTester._drain_dgram(sock)
+                ident = ConnectionTester._icmp_ident(sock)
+                header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+                checksum = ConnectionTester._icmp_checksum(header + ICMP_PAYLOAD)
+                start = time.perf_counter_ns()
+                sock.send(struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum, ident, seq) + ICMP_PAYLOAD)
+                selector.register(sock, selectors.EVENT_READ, (host, start))
+            except Exception as e:
+                if sock is not None:
+                    socks.pop(host.name, None)
+                    sock.close()
+                results[host.name] = TestResult(timestamp=now, host=host.host, port=host.port, protocol='icmp', success=False, error=str(e))
+    
+    @staticmethod
+    def _read_echo_reply(sock: socket.socket, sock_type: int, seq: int) -> bool:
+        buf = ConnectionTester._UDP_BUF
+        n = sock.recv_into(buf)
+        # Raw sockets include the IP header
+        offset = (buf[0] & 0x0F) * 4 if n and buf[0] >> 4 == 4 else 0
+        if n < offset + 8:
+            return False
+        icmp_type, _, _, ident, reply_seq = struct.unpack_from('!BBHHH', buf, offset)
+        if icmp_type != ICMP_ECHO_REPLY or reply_seq != seq:
+            return False
+        return sock_type != socket.SOCK_RAW or ident == ConnectionTester._icmp_ident(sock)
 
 
 class DataExporter:
-    @staticmethod
-    def to_csv(data: Dict[str, AggregatedStats], filepath: str, time_key: str = 'Time'):
-        with open(filepath, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([time_key, 'Sent', 'Received', 'Avg RTT (ms)', 'Success', 'Failed', 'Packet Loss %'])
-            for key in sorted(data.keys()):
-                stats = data[key]
-                writer.writerow([key, stats.sent, stats.received, f"{stats.avg_rtt:.2f}", stats.success_count, stats.fail_count, f"{stats.packet_loss * 100:.2f}"])
+    TXT_ROW = "%-20s %-12d %-12d %-18.2f %-12d %-12d %-10s\n"
     
-    @staticmethod
-    def to_json(data: Dict[str, AggregatedStats], filepath: str):
-        export_data = {key: stats.to_dict() for key, stats in data.items()}
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(export_data, f, indent=2, default=str)
+    def __init__(self):
+        self._files: Dict[str, Any] = {}
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._drain_write_queue, daemon=True)
+        self._thread.start()
+    
+    def _drain_write_queue(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            func, args = job
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"⚠️ Failed to write stats: {e}")
+    
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+    
+    def _open(self, filepath: str, newline: Optional[str] = None):
+        f = self._files.get(filepath)
+        if f is None:
+            f = open(filepath, 'a', newline=newline, encoding='utf-8', buffering=1 << 16)
+            self._files[filepath] = f
+        return f
+    
+    def append_csv(self, rows: List[Tuple[int, AggregatedStats]], filepath: str, time_key: str = 'Time'):
+        self._queue.put((self._append_csv, (rows, filepath, time_key)))
+    
+    def _append_csv(self, rows: List[Tuple[int, AggregatedStats]], filepath: str, time_key: str):
+        f = self._open(filepath, newline='')
+        writer = csv.writer(f)
+        if f.tell() == 0:
+            writer.writerow([time_key, 'Sent', 'Received', 'Avg RTT (ms)', 'Success', 'Failed', 'Packet Loss %', 'RTT StdDev (ms)'])
+        writer.writerows([format_epoch(key), stats.sent, stats.received, f"{stats.avg_rtt:.2f}", stats.success_count, stats.fail_count, f"{stats.packet_loss * 100:.2f}", f"{stats.rtt_stddev:.2f}"]
+                         for key, stats in rows)
+        f.flush()
+    
+    def append_json(self, rows: List[Tuple[int, AggregatedStats]], filepath: str):
+        self._queue.put((self._append_json, (rows, filepath)))
+    
+    def _append_json(self, rows: List[Tuple[int, AggregatedStats]], filepath: str):
+        f = self._files.get(filepath)
+        if f is None:
+            f = open(filepath, 'wb+', buffering=1 << 16)
+            self._files[filepath] = f
+        # Written over the closing brace, without the batch's own braces
+        entries = json_bytes({format_epoch(key): stats.to_dict() for key, stats in rows}, indent=True)[2:-2]
+        if f.tell() == 0:
+            f.write(b'{\n' + entries + b'\n}')
+        else:
+            f.seek(-2, os.SEEK_END)
+            f.write(b',\n' + entries + b'\n}')
+        f.flush()
+    
+    def append_txt(self, rows: List[Tuple[int, AggregatedStats]], filepath: str, title: str, time_key: str, packet_loss_threshold: float):
+        self._queue.put((self._append_txt, (rows, filepath, title, time_key, packet_loss_threshold)))
+    
+    def _append_txt(self, rows: List[Tuple[int, AggregatedStats]], filepath: str, title: str, time_key: str, packet_loss_threshold: float):
+        f = self._open(filepath)
+        lines = []
+        if f.tell() == 0:
+            lines.append(f"{title}:\n{'=' * 100}\n")
+            lines.append(f"{time_key:<20} {'Sent':<12} {'Received':<12} {'Avg RTT (ms)':<18} {'Success':<12} {'Failed':<12} {'Outage':<10}\n")
+            lines.append("-" * 100 + "\n")
+        row = self.TXT_ROW
+        lines.extend(row % (format_epoch(key), stats.sent, stats.received, stats.avg_rtt, stats.success_count, stats.fail_count,
+                            'Yes' if stats.is_outage(packet_loss_threshold) else 'No')
+                     for key, stats in rows)
+        f.write(''.join(lines))
+        f.flush()
+    
+    def write_text(self, text: str, filepath: str):
+        self._queue.put((self._write_text, (text, filepath)))
     
     @staticmethod
-    def to_txt(data: Dict[str, AggregatedStats], filepath: str, title: str, time_key: str, packet_loss_threshold: float):
+    def _write_text(text: str, filepath: str):
         with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(f"{title}:\n{'=' * 100}\n")
-            f.write(f"{time_key:<20} {'Sent':<12} {'Received':<12} {'Avg RTT (ms)':<18} {'Success':<12} {'Failed':<12} {'Outage':<10}\n")
-            f.write("-" * 100 + "\n")
-            for key in sorted(data.keys()):
-                stats = data[key]
-                outage = stats.packet_loss > packet_loss_threshold
-                f.write(f"{key:<20} {stats.sent:<12} {stats.received:<12} {stats.avg_rtt:<18.2f} {stats.success_count:<12} {stats.fail_count:<12} {'Yes' if outage else 'No':<10}\n")
+            f.write(text)
 
 
 class ChartGenerator:
@@ -216,23 +679,19 @@ class ChartGenerator:
                 print("⚠️ matplotlib not installed. Charts will not be generated.")
         return self._matplotlib_available
     
-    def generate_all_charts(self, second_data: Dict[str, AggregatedStats], minute_data: Dict[str, AggregatedStats]):
+    def generate_all_charts(self, second_data: Dict[int, AggregatedStats], minute_data: Dict[int, AggregatedStats]):
         if not self._init_matplotlib():
             return
-        self._generate_rtt_chart(minute_data, 'rtt_chart.png', 'RTT Over Time')
-        self._generate_packet_loss_chart(minute_data, 'packet_loss.png')
+        times = [datetime.fromtimestamp(stats.ts_epoch) for stats in minute_data.values()]
+        self._generate_rtt_chart(times, array('d', (stats.avg_rtt for stats in minute_data.values())),
+                                 'rtt_chart.png', 'RTT Over Time')
+        self._generate_packet_loss_chart(times, array('d', (stats.packet_loss * 100 for stats in minute_data.values())),
+                                         'packet_loss.png')
         print(f"📊 Charts saved to {self.output_dir}/")
     
-    def _generate_rtt_chart(self, data: Dict[str, AggregatedStats], filename: str, title: str):
-        if not data or not self.plt:
+    def _generate_rtt_chart(self, times: List[datetime], rtts: 'array[float]', filename: str, title: str):
+        if not times or not self.plt:
             return
-        times, rtts = [], []
-        for key in sorted(data.keys()):
-            try:
-                times.append(datetime.strptime(key, '%Y-%m-%d %H:%M:%S'))
-            except ValueError:
-                times.append(datetime.strptime(key, '%Y-%m-%d %H:%M:00'))
-            rtts.append(data[key].avg_rtt)
         fig, ax = self.plt.subplots(figsize=(12, 6))
         ax.plot(times, rtts, 'b-', linewidth=1)
         ax.set_xlabel('Time')
@@ -242,16 +701,9 @@ class ChartGenerator:
         fig.savefig(os.path.join(self.output_dir, filename), dpi=150, bbox_inches='tight')
         self.plt.close(fig)
     
-    def _generate_packet_loss_chart(self, data: Dict[str, AggregatedStats], filename: str):
-        if not data or not self.plt:
+    def _generate_packet_loss_chart(self, times: List[datetime], losses: 'array[float]', filename: str):
+        if not times or not self.plt:
             return
-        times, losses = [], []
-        for key in sorted(data.keys()):
-            try:
-                times.append(datetime.strptime(key, '%Y-%m-%d %H:%M:%S'))
-            except ValueError:
-                times.append(datetime.strptime(key, '%Y-%m-%d %H:%M:00'))
-            losses.append(data[key].packet_loss * 100)
         fig, ax = self.plt.subplots(figsize=(12, 6))
         ax.bar(times, losses, width=0.0007, color='red', alpha=0.7)
         ax.set_xlabel('Time')
@@ -365,30 +817,47 @@ refreshCharts();
 update();setInterval(update,2000);
 </script></body></html>'''
     
+    STATS_CACHE_TTL = 0.5
+    
     def __init__(self, port: int = 5000):
         self.port = port
         self.app = None
+        self._stats_cache: Tuple[float, bytes] = (0.0, b'')
+        self._stats_lock = threading.Lock()
         
     def start(self, data_provider: Callable[[], Dict[str, Any]]):
         try:
-            from flask import Flask, jsonify, Response
+            from flask import Flask, Response, request
         except ImportError:
             print("⚠️ Flask not installed. Web dashboard disabled.")
             return False
         
         self.app = Flask(__name__)
         self.app.config['data_provider'] = data_provider
-        template = self.HTML_TEMPLATE
+        html = self.HTML_TEMPLATE.encode('utf-8')
+        html_gz = gzip.compress(html, 6)
         
         @self.app.route('/')
         def index():
-            return Response(template, mimetype='text/html')
+            headers = {'Cache-Control': 'public, max-age=3600', 'Vary': 'Accept-Encoding'}
+            if 'gzip' in request.headers.get('Accept-Encoding', ''):
+                headers['Content-Encoding'] = 'gzip'
+                return Response(html_gz, mimetype='text/html', headers=headers)
+            return Response(html, mimetype='text/html', headers=headers)
         
         @self.app.route('/api/stats')
         def stats():
-            return jsonify(self.app.config['data_provider']())
+            return Response(self._stats_body(), mimetype='application/json')
         
         def run():
+            try:
+                import uvicorn
+                from asgiref.wsgi import WsgiToAsgi
+            except ImportError:
+                uvicorn = None
+            if uvicorn is not None:
+                uvicorn.run(WsgiToAsgi(self.app), host='0.0.0.0', port=self.port, log_level='error', access_log=False)
+                return
             import logging
             logging.getLogger('werkzeug').setLevel(logging.ERROR)
             self.app.run(host='0.0.0.0', port=self.port, threaded=True, use_reloader=False)
@@ -399,37 +868,117 @@ update();setInterval(update,2000);
         import webbrowser
         webbrowser.open(f"http://localhost:{self.port}")
         return True
+    
+    def _stats_body(self) -> bytes:
+        with self._stats_lock:
+            now = time.monotonic()
+            ts, body = self._stats_cache
+            if not body or now - ts > self.STATS_CACHE_TTL:
+                body = json_bytes(self.app.config['data_provider']())
+                self._stats_cache = (now, body)
+            return body
 
 
 class NetworkMonitor:
     def __init__(self, config: argparse.Namespace):
         self.config = config
         self.hosts = self._parse_hosts(config.hosts)
+        self._icmp_type: Optional[int] = None
+        if any(h.protocol == 'icmp' for h in self.hosts):
+            self._icmp_type = ConnectionTester.icmp_socket_type()
+            if self._icmp_type is None:
+                print("⚠️ ICMP needs root/CAP_NET_RAW (or ping_group_range on Linux). Probing those hosts over TCP instead.")
+                self.hosts = [HostConfig(host=h.host, port=h.port or 53, protocol='tcp') if h.protocol == 'icmp' else h for h in self.hosts]
         self.shutdown_requested = False
-        self.host_data: Dict[str, Dict[str, Dict[str, AggregatedStats]]] = {}
-        for host in self.hosts:
-            self.host_data[host.name] = {'second': {}, 'minute': {}, 'hour': {}}
+        self._stop = threading.Event()
+        self.host_data: Dict[str, HostSeries] = {
+            host.name: HostSeries(print_window=SlidingWindow(int(config.write_interval))) for host in self.hosts}
         self.last_results: Dict[str, TestResult] = {}
         self.startup_time = datetime.now()
         self.session_folder = f"session_{self.startup_time.strftime('%Y%m%d_%H%M%S')}"
         os.makedirs(self.session_folder, exist_ok=True)
+        self._host_folders: Dict[str, str] = {}
+        for host in self.hosts:
+            self._host_folders[host.name] = os.path.join(self.session_folder, host.name.replace(':', '_').replace('/', '_'))
+            os.makedirs(self._host_folders[host.name], exist_ok=True)
+        self.exporter = DataExporter()
         self.alert_manager = AlertManager(self._get_alert_config())
         self.chart_generator = ChartGenerator(self.session_folder, silent=not config.generate_charts)
         self.web_dashboard: Optional[WebDashboard] = None
         if config.web_dashboard:
             self.web_dashboard = WebDashboard(config.web_port)
         self.last_write_time = time.time()
-        self.last_cleanup_time = time.time()
+        self._tcp_hosts = [h for h in self.hosts if h.protocol not in ('udp', 'icmp')]
+        self._udp_hosts = [h for h in self.hosts if h.protocol == 'udp']
+        self._icmp_hosts = [h for h in self.hosts if h.protocol == 'icmp']
+        self._selector = selectors.DefaultSelector()
+        self._dgram_socks: Dict[str, socket.socket] = {}
+        self._tcp_pool: Optional[Dict[str, socket.socket]] = None
+        if config.tcp_reuse:
+            if TCP_REUSE_SUPPORTED:
+                self._tcp_pool = {}
+            else:
+                print("⚠️ --tcp-reuse needs TCP_INFO (Linux). Using a new connection per probe.")
+        self._busy_poll = self._check_busy_poll(config.busy_poll)
+        self._unpinned_cpus: Optional[set] = None
         signal.signal(signal.SIGINT, self._signal_handler)
     
+    def _generate_charts(self):
+        if importlib.util.find_spec('matplotlib') is None:
+            print("⚠️ matplotlib not installed. Charts will not be generated.")
+            return
+        jobs = [(self._host_folders[host.name], self.host_data[host.name].minute) for host in self.hosts]
+        if self._unpinned_cpus is not None:
+            # Chart workers would inherit the --probe-cpu pin
+            os.sched_setaffinity(0, self._unpinned_cpus)
+            self._unpinned_cpus = None
+        if len(jobs) == 1:
+            render_host_charts(*jobs[0])
+            return
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as pool:
+                for future in [pool.submit(render_host_charts, *job) for job in jobs]:
+                    future.result()
+        except Exception as e:
+            print(f"⚠️ Failed to generate charts: {e}")
+    
+    @staticmethod
+    def _check_busy_poll(usec: int) -> int:
+        if not usec:
+            return 0
+        if SO_BUSY_POLL is None:
+            print("⚠️ --busy-poll needs SO_BUSY_POLL (Linux). Using interrupt-driven receive.")
+            return 0
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.setsockopt(socket.SOL_SOCKET, SO_BUSY_POLL, usec)
+        except OSError as e:
+            print(f"⚠️ SO_BUSY_POLL rejected ({e}); raising it usually needs CAP_NET_ADMIN. Using interrupt-driven receive.")
+            return 0
+        return usec
+    
+    def _pin_probe_thread(self, cpu: int):
+        if not hasattr(os, 'sched_setaffinity'):
+            print("⚠️ --probe-cpu needs sched_setaffinity (Linux). Not pinning.")
+            return
+        try:
+            cpus = os.sched_getaffinity(0)
+            os.sched_setaffinity(0, {cpu})
+            self._unpinned_cpus = cpus
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not pin probes to CPU {cpu}: {e}")
+    
     def _parse_hosts(self, hosts_list: List[str]) -> List[HostConfig]:
         configs = []
         for host_str in hosts_list:
             parts = host_str.replace('/', ':').split(':')
             host = parts[0]
-            port = int(parts[1]) if len(parts) > 1 else 53
-            protocol = parts[2] if len(parts) > 2 else 'tcp'
-            configs.append(HostConfig(host=host, port=port, protocol=protocol.lower()))
+            rest = parts[1:]
+            port = int(rest.pop(0)) if rest and rest[0].isdigit() else None
+            protocol = rest[0].lower() if rest else 'tcp'
+            if port is None:
+                port = 0 if protocol == 'icmp' else 53
+            configs.append(HostConfig(host=host, port=port, protocol=protocol))
         return configs
     
     def _get_alert_config(self) -> Dict[str, Any]:
@@ -442,161 +991,188 @@ class NetworkMonitor:
         if not self.shutdown_requested:
             print("\n⏳ Shutting down...")
             self.shutdown_requested = True
+            # Event.set() here could deadlock with the interrupted wait()
+            threading.Thread(target=self._stop.set, daemon=True).start()
         else:
             raise KeyboardInterrupt
     
     def _get_web_stats(self) -> Dict[str, Any]:
-        total_sent = total_received = 0
-        all_rtts: List[float] = []
-        minute_rtt, minute_loss = {}, {}
-        hour_rtt, hour_loss = {}, {}
-        for data in self.host_data.values():
-            for stats in data['second'].values():
-                total_sent += stats.sent
-                total_received += stats.received
-                all_rtts.extend(stats.rtts)
-            for key, stats in data['minute'].items():
-                if key not in minute_rtt:
-                    minute_rtt[key] = []
-                    minute_loss[key] = []
-                minute_rtt[key].append(stats.avg_rtt)
-                minute_loss[key].append(stats.packet_loss * 100)
-            for key, stats in data['hour'].items():
-                if key not in hour_rtt:
-                    hour_rtt[key] = []
-                    hour_loss[key] = []
-                hour_rtt[key].append(stats.avg_rtt)
-                hour_loss[key].append(stats.packet_loss * 100)
+        totals = AggregatedStats.combine(data.totals for data in self.host_data.values())
         hosts_info = []
         for host in self.hosts:
             last_result = self.last_results.get(host.name)
-            host_data = self.host_data[host.name]['second']
-            total_success = sum(s.success_count for s in host_data.values())
-            total_tests = sum(s.sent for s in host_data.values())
+            ht = self.host_data[host.name].totals
             hosts_info.append({
                 'name': host.name, 'protocol': host.protocol,
                 'online': last_result.success if last_result else False,
                 'rtt': last_result.rtt_ms if last_result else None,
-                'success_rate': (total_success / total_tests * 100) if total_tests > 0 else 0,
+                'success_rate': (ht.success_count / ht.sent * 100) if ht.sent > 0 else 0,
             })
         return {
-            'total_sent': total_sent, 'total_received': total_received,
-            'total_lost': total_sent - total_received,
-            'packet_loss_percent': ((total_sent - total_received) / total_sent * 100) if total_sent > 0 else 0,
-            'avg_rtt': sum(all_rtts) / len(all_rtts) if all_rtts else 0,
+            'total_sent': totals.sent, 'total_received': totals.received,
+            'total_lost': totals.sent - totals.received,
+            'packet_loss_percent': totals.packet_loss * 100,
+            'avg_rtt': totals.avg_rtt,
             'hosts': hosts_info, 'session_start': self.startup_time.strftime('%Y-%m-%d %H:%M:%S'),
             'outages': self._detect_outages(),
-            'minute_data': {'rtt': {k: sum(v)/len(v) for k,v in minute_rtt.items()}, 'loss': {k: sum(v)/len(v) for k,v in minute_loss.items()}},
-            'hour_data': {'rtt': {k: sum(v)/len(v) for k,v in hour_rtt.items()}, 'loss': {k: sum(v)/len(v) for k,v in hour_loss.items()}}
+            'minute_data': self._mean_by_key([data.minute for data in self.host_data.values()]),
+            'hour_data': self._mean_by_key([data.hour for data in self.host_data.values()]),
         }
     
+    @staticmethod
+    def _mean_by_key(series: List[Dict[int, AggregatedStats]]) -> Dict[str, Dict[str, float]]:
+        sums: Dict[int, List[float]] = {}
+        for buckets in series:
+            for key, stats in buckets.items():
+                acc = sums.get(key)
+                if acc is None:
+                    acc = sums[key] = [0.0, 0.0, 0]
+                acc[0] += stats.avg_rtt
+                acc[1] += stats.packet_loss * 100
+                acc[2] += 1
+        return {'rtt': {format_epoch(k): acc[0] / acc[2] for k, acc in sums.items()},
+                'loss': {format_epoch(k): acc[1] / acc[2] for k, acc in sums.items()}}
+    
     def _detect_outages(self) -> List[Dict[str, Any]]:
-        all_outages: List[Dict[str, Any]] = []
-        for host_name, data in self.host_data.items():
-            second_data = data['second']
-            bad_seconds = []
-            for key in sorted(second_data.keys()):
-                stats = second_data[key]
-                if stats.sent > 0 and stats.packet_loss > self.config.packet_loss_threshold:
-                    bad_seconds.append({'time': key, 'sent': stats.sent, 'received': stats.received, 'loss_percent': stats.packet_loss * 100})
-            if not bad_seconds:
-                continue
-            current_outage: Optional[Dict[str, Any]] = None
-            for sec in bad_seconds:
-                sec_time = datetime.strptime(sec['time'], '%Y-%m-%d %H:%M:%S')
-                if current_outage is None:
-                    current_outage = {'host': host_name, 'start': sec['time'], 'end': sec['time'], 'sent': sec['sent'], 'received': sec['received'], 'seconds': [sec]}
-                else:
-                    last_time = datetime.strptime(current_outage['end'], '%Y-%m-%d %H:%M:%S')
-                    if (sec_time - last_time).total_seconds() <= 1:
-                        current_outage['end'] = sec['time']
-                        current_outage['sent'] += sec['sent']
-                        current_outage['received'] += sec['received']
-                        current_outage['seconds'].append(sec)
-                    else:
-                        current_outage['duration'] = len(current_outage['seconds'])
-                        current_outage['loss_percent'] = ((current_outage['sent'] - current_outage['received']) / current_outage['sent'] * 100) if current_outage['sent'] > 0 else 0
-                        del current_outage['seconds']
-                        all_outages.append(current_outage)
-                        current_outage = {'host': host_name, 'start': sec['time'], 'end': sec['time'], 'sent': sec['sent'], 'received': sec['received'], 'seconds': [sec]}
-            if current_outage:
-                current_outage['duration'] = len(current_outage['seconds'])
-                current_outage['loss_percent'] = ((current_outage['sent'] - current_outage['received']) / current_outage['sent'] * 100) if current_outage['sent'] > 0 else 0
-                del current_outage['seconds']
-                all_outages.append(current_outage)
-        return sorted(all_outages, key=lambda x: x['start'], reverse=True)
-    
-    def _update_stats(self, host: HostConfig, result: TestResult):
-        data = self.host_data[host.name]
-        now = result.timestamp
-        keys = [(now.strftime('%Y-%m-%d %H:%M:%S'), data['second']), (now.strftime('%Y-%m-%d %H:%M:00'), data['minute']), (now.strftime('%Y-%m-%d %H:00:00'), data['hour'])]
-        for time_key, storage in keys:
-            if time_key not in storage:
-                storage[time_key] = AggregatedStats()
-            stats = storage[time_key]
-            stats.sent += 1
-            if result.success:
-                stats.received += 1
-                stats.success_count += 1
-                if result.rtt_ms is not None:
-                    stats.rtts.append(result.rtt_ms)
+        per_host: List[List[Dict[str, Any]]] = []
+        for data in self.host_data.values():
+            host_outages = [outage for _, outage in data.outages]
+            open_outage = data.open_outage
+            if open_outage is not None:
+                host_outages.append(self._finish_outage(open_outage))
+            host_outages.reverse()
+            per_host.append(host_outages)
+        if len(per_host) == 1:
+            return per_host[0]
+        return list(heapq.merge(*per_host, key=lambda x: x['start'], reverse=True))
+    
+    def _close_second(self, host_name: str, data: HostSeries):
+        stats, minute, hour = data.current
+        stored = data.second.get(stats.ts_epoch)
+        if stored is not None and stored is not stats:
+            # Reopened after the clock stepped back
+            stored.merge(stats)
+        if stored is None or stored is stats or all(row is not stored for _, row in data.pending_seconds):
+            data.pending_seconds.append((stats.ts_epoch, stats))
+        minute.merge(stats)
+        hour.merge(stats)
+        data.totals.merge(stats)
+        data.print_window.push(stats)
+        data.alert_window.push(stats)
+        outage = data.open_outage
+        if stats.is_outage(self.config.packet_loss_threshold):
+            if outage is not None and stats.ts_epoch - data.open_outage_end <= 1:
+                outage['end'] = stats.ts_epoch
+                outage['sent'] += stats.sent
+                outage['received'] += stats.received
+                outage['duration'] += 1
             else:
-                stats.fail_count += 1
+                if outage is not None:
+                    data.outages.append((data.open_outage_end, self._finish_outage(outage)))
+                data.open_outage = {'host': host_name, 'start': stats.ts_epoch, 'end': stats.ts_epoch, 'sent': stats.sent, 'received': stats.received, 'duration': 1}
+            data.open_outage_end = stats.ts_epoch
+        elif outage is not None:
+            data.outages.append((data.open_outage_end, self._finish_outage(outage)))
+            data.open_outage = None
+    
+    @staticmethod
+    def _finish_outage(outage: Dict[str, Any]) -> Dict[str, Any]:
+        return {**outage, 'start': format_epoch(outage['start']), 'end': format_epoch(outage['end']),
+                'loss_percent': ((outage['sent'] - outage['received']) / outage['sent'] * 100) if outage['sent'] > 0 else 0}
+    
+    def _update_stats(self, host: HostConfig, data: HostSeries, result: TestResult, epoch: int):
+        now = result.timestamp
+        if epoch != data.current_epoch:
+            minute = None
+            if data.current:
+                self._close_second(host.name, data)
+                minute = data.current[1]
+            self._roll_buckets(data, self._bucket_epochs(now, epoch), epoch)
+            if minute is not None and minute is not data.current[1]:
+                self._close_minute(data, minute)
+            if len(data.second) > self.config.max_seconds:
+                self._evict_oldest_second(data)
+        data.current[0].record(result.success, result.rtt_ms)
+    
+    @staticmethod
+    def _close_minute(data: HostSeries, minute: AggregatedStats):
+        if all(row is not minute for _, row in data.pending_minutes):
+            data.pending_minutes.append((minute.ts_epoch, minute))
+    
+    @staticmethod
+    def _bucket_epochs(now: datetime, epoch: int) -> Tuple[int, int, int]:
+        minute_epoch = epoch - now.second
+        return epoch, minute_epoch, minute_epoch - now.minute * 60
     
-    def _test_host(self, host: HostConfig) -> TestResult:
-        if host.protocol == 'udp':
-            return ConnectionTester.test_udp(host.host, host.port, self.config.timeout)
-        return ConnectionTester.test_tcp(host.host, host.port, self.config.timeout)
+    @staticmethod
+    def _roll_buckets(data: HostSeries, epochs: Tuple[int, int, int], epoch: int):
+        current = [AggregatedStats(ts_epoch=epoch)]
+        data.second.setdefault(epoch, current[0])
+        for bucket_epoch, storage in zip(epochs[1:], (data.minute, data.hour)):
+            stats = storage.get(bucket_epoch)
+            if stats is None:
+                stats = storage[bucket_epoch] = AggregatedStats(ts_epoch=bucket_epoch)
+            current.append(stats)
+        data.current = tuple(current)
+        data.current_epoch = epoch
+    
+    @staticmethod
+    def _evict_oldest_second(data: HostSeries):
+        second = data.second
+        oldest_key = next(iter(second))
+        if second[oldest_key] is data.current[0]:
+            # Not in the totals until it closes
+            return
+        data.totals.subtract(second.pop(oldest_key))
+        if not second:
+            return
+        oldest = next(iter(second.values())).ts_epoch
+        while data.outages and data.outages[0][0] < oldest:
+            data.outages.pop(0)
+    
+    def _test_hosts(self) -> List[TestResult]:
+        results = ConnectionTester.sweep(self._tcp_hosts, self._udp_hosts, self.config.timeout, self._selector,
+                                         self._dgram_socks, self._tcp_pool, self._busy_poll,
+                                         self._icmp_hosts, self._icmp_type)
+        return [results[h.name] for h in self.hosts]
     
     def _write_stats(self):
         for host in self.hosts:
-            host_folder = os.path.join(self.session_folder, host.name.replace(':', '_').replace('/', '_'))
-            os.makedirs(host_folder, exist_ok=True)
+            host_folder = self._host_folders[host.name]
             data = self.host_data[host.name]
-            DataExporter.to_txt(data['second'], os.path.join(host_folder, 'per_second.txt'), f"Per-second stats for {host.name}", "Time", self.config.packet_loss_threshold)
-            DataExporter.to_txt(data['minute'], os.path.join(host_folder, 'per_minute.txt'), f"Per-minute stats for {host.name}", "Time", self.config.packet_loss_threshold)
-            if self.config.export_csv:
-                DataExporter.to_csv(data['second'], os.path.join(host_folder, 'data.csv'))
-            if self.config.export_json:
-                DataExporter.to_json(data['second'], os.path.join(host_folder, 'data.json'))
+            seconds, data.pending_seconds = data.pending_seconds, []
+            minutes, data.pending_minutes = data.pending_minutes, []
+            if seconds:
+                self.exporter.append_txt(seconds, os.path.join(host_folder, 'per_second.txt'), f"Per-second stats for {host.name}", "Time", self.config.packet_loss_threshold)
+                if self.config.export_csv:
+                    self.exporter.append_csv(seconds, os.path.join(host_folder, 'data.csv'))
+                if self.config.export_json:
+                    self.exporter.append_json(seconds, os.path.join(host_folder, 'data.json'))
+            if minutes:
+                self.exporter.append_txt(minutes, os.path.join(host_folder, 'per_minute.txt'), f"Per-minute stats for {host.name}", "Time", self.config.packet_loss_threshold)
         outages = self._detect_outages()
-        with open(os.path.join(self.session_folder, 'outages.txt'), 'w', encoding='utf-8') as f:
-            if not outages:
-                f.write("No outages detected.\n")
-            else:
-                f.write(f"Outages: {len(outages)}\n{'=' * 60}\n")
-                for i, o in enumerate(outages, 1):
-                    f.write(f"#{i} {o['host']}: {o['start']} - {o['end']} ({o['duration']}s, {o['loss_percent']:.1f}% loss)\n")
-    
-    def _cleanup_old_data(self):
-        for data in self.host_data.values():
-            sd = data['second']
-            if len(sd) > self.config.max_seconds:
-                for key in sorted(sd.keys())[:len(sd) - self.config.max_seconds]:
-                    del sd[key]
+        if not outages:
+            text = "No outages detected.\n"
+        else:
+            text = f"Outages: {len(outages)}\n{'=' * 60}\n"
+            for i, o in enumerate(outages, 1):
+                text += f"#{i} {o['host']}: {o['start']} - {o['end']} ({o['duration']}s, {o['loss_percent']:.1f}% loss)\n"
+        self.exporter.write_text(text, os.path.join(self.session_folder, 'outages.txt'))
     
     def _print_stats(self):
-        total_sent = total_received = 0
-        all_rtts: List[float] = []
-        for data in self.host_data.values():
-            keys = sorted(data['second'].keys())
-            if len(keys) > 1:
-                for key in keys[-int(self.config.write_interval)-1:-1]:
-                    if key in data['second']:
-                        s = data['second'][key]
-                        total_sent += s.sent
-                        total_received += s.received
-                        all_rtts.extend(s.rtts)
-        if total_sent == 0:
+        totals = AggregatedStats.combine(data.print_window.totals for data in self.host_data.values())
+        if totals.sent == 0:
             return
-        loss = (total_sent - total_received) / total_sent
-        rtt = sum(all_rtts) / len(all_rtts) if all_rtts else 0
+        loss = totals.packet_loss
+        rtt = totals.avg_rtt
         now = datetime.now().strftime('%H:%M:%S')
-        print(f"{now:<10} Sent:{total_sent:<8} Recv:{total_received:<8} RTT:{rtt:<8.2f}ms Loss:{loss*100:<6.1f}% {'⚠️ OUTAGE' if loss > self.config.packet_loss_threshold else '✓'}")
+        print(f"{now:<10} Sent:{totals.sent:<8} Recv:{totals.received:<8} RTT:{rtt:<8.2f}ms Loss:{loss*100:<6.1f}% {'⚠️ OUTAGE' if totals.is_outage(self.config.packet_loss_threshold) else '✓'}")
     
     def run(self):
         if self.web_dashboard:
             self.web_dashboard.start(self._get_web_stats)
+        if self.config.probe_cpu is not None:
+            self._pin_probe_thread(self.config.probe_cpu)
         session_file = os.path.join(self.session_folder, 'session.txt')
         with open(session_file, 'w', encoding='utf-8') as f:
             f.write(f"Session: {self.startup_time.strftime('%Y-%m-%d %H:%M:%S')}\nHosts: {', '.join(h.name for h in self.hosts)}\n")
@@ -604,61 +1180,65 @@ class NetworkMonitor:
         print(f"   Hosts: {', '.join(h.name for h in self.hosts)}")
         print(f"   Folder: {self.session_folder}/")
         print("-" * 80)
+        next_tick = time.monotonic()
+        host_series = [self.host_data[host.name] for host in self.hosts]
         try:
             while not self.shutdown_requested:
-                for host in self.hosts:
-                    result = self._test_host(host)
+                results = self._test_hosts()
+                epoch = int(results[0].timestamp.timestamp()) if results else 0
+                for host, data, result in zip(self.hosts, host_series, results):
                     self.last_results[host.name] = result
-                    self._update_stats(host, result)
+                    self._update_stats(host, data, result, epoch)
                     if not result.success:
-                        recent = self.host_data[host.name]['second']
-                        keys = sorted(recent.keys())[-10:]
-                        if keys:
-                            rs = AggregatedStats()
-                            for k in keys:
-                                rs.sent += recent[k].sent
-                                rs.received += recent[k].received
-                            if rs.packet_loss > self.config.packet_loss_threshold:
-                                self.alert_manager.alert_outage(host.name, rs.to_dict())
+                        rs = AggregatedStats.combine((data.alert_window.totals, data.current[0]))
+                        if rs.is_outage(self.config.packet_loss_threshold):
+                            self.alert_manager.alert_outage(host.name, rs.to_dict())
                 ct = time.time()
                 if ct - self.last_write_time >= self.config.write_interval:
                     self._write_stats()
                     self._print_stats()
                     self.last_write_time = ct
-                if ct - self.last_cleanup_time >= 60:
-                    self._cleanup_old_data()
-                    self.last_cleanup_time = ct
-                time.sleep(self.config.interval)
+                next_tick += self.config.interval
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    self._stop.wait(delay)
+                else:
+                    next_tick = time.monotonic()
         except KeyboardInterrupt:
             pass
         finally:
             self._shutdown()
     
     def _shutdown(self):
+        self._selector.close()
+        for sock in (*(self._tcp_pool or {}).values(), *self._dgram_socks.values()):
+            sock.close()
+        for host_name, data in self.host_data.items():
+            if data.current:
+                self._close_second(host_name, data)
+                self._close_minute(data, data.current[1])
+                data.current, data.current_epoch = (), -1
         print("\n📊 Saving final stats...")
         self._write_stats()
+        self.exporter.close()
+        self.alert_manager.close()
         if self.config.generate_charts:
-            for host in self.hosts:
-                data = self.host_data[host.name]
-                cg = ChartGenerator(os.path.join(self.session_folder, host.name.replace(':', '_').replace('/', '_')))
-                cg.generate_all_charts(data['second'], data['minute'])
-        total_sent = total_received = 0
-        all_rtts: List[float] = []
-        for data in self.host_data.values():
-            for s in data['second'].values():
-                total_sent += s.sent
-                total_received += s.received
-                all_rtts.extend(s.rtts)
+            self._generate_charts()
+        totals = AggregatedStats.combine(data.totals for data in self.host_data.values())
         duration = datetime.now() - self.startup_time
         print(f"\n{'=' * 50}")
         print(f"Duration: {str(duration).split('.')[0]}")
-        print(f"Sent: {total_sent:,} | Received: {total_received:,} | Lost: {total_sent - total_received:,}")
-        print(f"Packet Loss: {((total_sent - total_received) / total_sent * 100) if total_sent > 0 else 0:.2f}%")
-        print(f"Avg RTT: {sum(all_rtts) / len(all_rtts) if all_rtts else 0:.2f} ms")
+        print(f"Sent: {totals.sent:,} | Received: {totals.received:,} | Lost: {totals.sent - totals.received:,}")
+        print(f"Packet Loss: {totals.packet_loss * 100:.2f}%")
+        print(f"Avg RTT: {totals.avg_rtt:.2f} ms")
         print(f"{'=' * 50}")
         print(f"📁 Saved to: {self.session_folder}/")
 
 
+def render_host_charts(output_dir: str, minute_data: Dict[int, AggregatedStats]):
+    ChartGenerator(output_dir).generate_all_charts({}, minute_data)
+
+
 def parse_arguments() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description='Network Connection Monitor', formatter_class=argparse.RawDescriptionHelpFormatter)
     parser.add_argument('-H', '--hosts', nargs='+', default=DEFAULT_HOSTS, help='Hosts (host:port/protocol)')
@@ -670,6 +1250,9 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument('--csv', action='store_true', dest='export_csv', help='Export CSV')
     parser.add_argument('--json', action='store_true', dest='export_json', help='Export JSON')
     parser.add_argument('--charts', action='store_true', dest='generate_charts', help='Generate charts')
+    parser.add_argument('--tcp-reuse', action='store_true', dest='tcp_reuse', help='Keep TCP connections open and read kernel RTT (Linux)')
+    parser.add_argument('--busy-poll', type=int, default=0, metavar='USEC', dest='busy_poll', help='SO_BUSY_POLL time for probe sockets in microseconds (Linux)')
+    parser.add_argument('--probe-cpu', type=int, metavar='N', dest='probe_cpu', help='Pin the probe loop to CPU N (Linux)')
     parser.add_argument('--web', action='store_true', dest='web_dashboard', help='Enable web dashboard')
     parser.add_argument('--web-port', type=int, default=5000, dest='web_port')
     parser.add_argument('--email-to', dest='email_to')
@@ -684,7 +1267,7 @@ def parse_arguments() -> argparse.Namespace:
 
 
 if __name__ == '__main__':
-    import sys
+    multiprocessing.freeze_support()
     if len(sys.argv) == 1:
         sys.argv.extend(['--web'])
     config = parse_arguments()